@@ -1,5 +1,5 @@
 # create_users.py
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, select
 from sqlalchemy.orm import sessionmaker
 from models import Base, User
 import hashlib
@@ -9,35 +9,47 @@ DATABASE_URL = "sqlite:///./products.db"
 engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
 SessionLocal = sessionmaker(bind=engine)
 
+DEFAULT_PASSWORD = "test123"
+
+###Test Users for different roles based on scenarios given.
+###In Production, it is recommended to test in a more secure way.
+USERS = [
+    ("admin", "admin", DEFAULT_PASSWORD),
+    ("alice", "privileged", DEFAULT_PASSWORD),
+    ("bob", "nonadmin", DEFAULT_PASSWORD),
+]
+
 def hash_password(p: str) -> str:
-    return hashlib.sha256(p.encode()).hexdigest()
+    return hashlib.blake2b(p.encode(), digest_size=32).hexdigest()
 
 def create_tables():
     Base.metadata.create_all(bind=engine)
 
-def create_user(username: str, role: str, password: str = "test123"):
+def create_users(users=USERS):
     db = SessionLocal()
     try:
-        u = db.query(User).filter(User.username == username).first()
-        if u:
-            print(f"{username} already exists")
-            return
-        user = User(
-            username=username,
-            role=role,
-            hashed_password=hash_password(password)
+        names = [username for username, _, _ in users]
+        existing = set(
+            db.execute(select(User.username).where(User.username.in_(names))).scalars().all()
         )
-        db.add(user)
+        for username, role, password in users:
+            if username in existing:
+                print(f"{username} already exists")
+                continue
+            db.add(User(
+                username=username,
+                role=role,
+                hashed_password=hash_password(password)
+            ))
+            print(f"Created: {username} ({role})")
         db.commit()
-        print(f"Created: {username} ({role})")
     finally:
         db.close()
 
+def create_user(username: str, role: str, password: str = DEFAULT_PASSWORD):
+    create_users([(username, role, password)])
+
 
 if __name__ == "__main__":
     create_tables()
-    ###Test Users for different roles based on scenarios given.
-    ###In Production, it is recommended to test in a more secure way.
-    create_user("admin", "admin")
-    create_user("alice", "privileged")
-    create_user("bob", "nonadmin")
\ No newline at end of file
+    create_users()
@@ -1,13 +1,23 @@
 # main.py
-import jwt
-from jwt import PyJWTError
-from datetime import datetime, timedelta
+import base64
+import binascii
+import hashlib
+import hmac
+import time
+import orjson
+from collections import namedtuple
+from datetime import datetime, timezone
+from functools import lru_cache
 from typing import Optional, List
 
-from fastapi import FastAPI, Depends, Header, HTTPException
+from cachetools import TTLCache
+from fastapi import FastAPI, Depends, HTTPException, Request
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
 from sqlalchemy.orm import Session, sessionmaker
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, insert, select
+from sqlalchemy.exc import IntegrityError
 
 from models import Base, User, Product
 
@@ -18,8 +28,27 @@ DATABASE_URL = "sqlite:///./products.db"
 SECRET_KEY = "CHANGE_THIS_SECRET_KEY"    # IMPORTANT: use env / secure key vault storage in production like kms/azure key vault.
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 15
+USER_CACHE_TTL_SECONDS = 30
+_BEARER_PREFIXES = ("Bearer ", "bearer ")
+
+_SECRET = SECRET_KEY.encode()
+# the header never changes, so it is encoded once instead of per token
+_HEADER_B64 = base64.urlsafe_b64encode(orjson.dumps({"alg": ALGORITHM, "typ": "JWT"})).rstrip(b"=")
 
 engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+
+
+@event.listens_for(engine, "connect")
+def _set_sqlite_pragmas(dbapi_conn, _):
+    # WAL lets GETs read while a commit is in progress; NORMAL fsyncs on checkpoint only
+    cursor = dbapi_conn.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA mmap_size=268435456")
+    cursor.close()
+
+
 SessionLocal = sessionmaker(bind=engine)
 Base.metadata.create_all(bind=engine)
 
@@ -28,60 +57,145 @@ Base.metadata.create_all(bind=engine)
 # Utility Helpers
 # ------------------------------------------
 def get_db():
-    db = SessionLocal()
-    try:
+    with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
+
+
+def _b64encode(raw: bytes) -> bytes:
+    return base64.urlsafe_b64encode(raw).rstrip(b"=")
+
+
+def _b64decode(segment: bytes) -> bytes:
+    return base64.urlsafe_b64decode(segment + b"=" * (-len(segment) % 4))
+
+
+def _sign(signing_input: bytes) -> bytes:
+    return hmac.new(_SECRET, signing_input, hashlib.sha256).digest()
 
 
 def create_access_token(*, data: dict, expires_minutes: int = ACCESS_TOKEN_EXPIRE_MINUTES):
     to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(minutes=expires_minutes)
-    to_encode.update({"exp": expire})
-    encoded = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded
+    # callers that also need the expiry can pass their own integer "exp"
+    to_encode.setdefault("exp", int(time.time()) + expires_minutes * 60)
+    signing_input = _HEADER_B64 + b"." + _b64encode(orjson.dumps(to_encode))
+    return (signing_input + b"." + _b64encode(_sign(signing_input))).decode("ascii")
 
 
 def decode_token(token: str):
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
-    except PyJWTError:
+        signing_input, _, sig_b64 = token.encode("ascii").rpartition(b".")
+        header_b64, _, payload_b64 = signing_input.partition(b".")
+        if header_b64 != _HEADER_B64 or not payload_b64:
+            return None
+        if not hmac.compare_digest(_b64decode(sig_b64), _sign(signing_input)):
+            return None
+        payload = orjson.loads(_b64decode(payload_b64))
+    except (UnicodeEncodeError, binascii.Error, ValueError):
         return None
 
+    if not isinstance(payload, dict):
+        return None
+    exp = payload.get("exp")
+    if not isinstance(exp, (int, float)) or exp <= time.time():
+        return None
+    return payload
+
+
+@lru_cache(maxsize=4096)
+def _verify_cached(token: str, minute_bucket: int):
+    # minute_bucket only rotates the cache key; exp is re-checked by the caller
+    return decode_token(token)
+
+
+# only the columns auth and the routes actually read
+AuthUser = namedtuple("AuthUser", ["id", "username", "role"])
+
+# users are effectively read-only here, so skip the SELECT for repeat callers
+_user_cache = TTLCache(maxsize=1024, ttl=USER_CACHE_TTL_SECONDS)
+
 
 # ------------------------------------------
 # Authentication Dependency
 # ------------------------------------------
-async def get_current_user(authorization: str = Header(None), db: Session = Depends(get_db)):
+def _verify_authorization(authorization: Optional[str]) -> dict:
     if not authorization:
         raise HTTPException(401, "Missing Authorization header")
 
-    scheme, _, token = authorization.partition(" ")
-    if scheme.lower() != "bearer" or not token:
+    # common spellings hit the C-level startswith; lower() only runs for odd casings
+    if len(authorization) < 8 or not (
+        authorization.startswith(_BEARER_PREFIXES) or authorization[:7].lower() == "bearer "
+    ):
         raise HTTPException(401, "Invalid Authorization header format")
+    token = authorization[7:]
 
-    payload = decode_token(token)
-    if not payload:
+    now = time.time()
+    payload = _verify_cached(token, int(now // 60))
+    if not payload or payload["exp"] <= now:
         raise HTTPException(401, "Invalid or expired token")
 
-    username: str = payload.get("sub")
-    if not username:
+    if not payload.get("sub"):
         raise HTTPException(401, "Invalid token payload")
 
-    user = db.query(User).filter(User.username == username).first()
-    if not user:
-        raise HTTPException(401, "User not found")
+    return payload
+
+
+class AuthMiddleware:
+    """Verify the bearer token once per request and keep the result in scope state."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            authorization = None
+            for name, value in scope["headers"]:
+                if name == b"authorization":
+                    authorization = value.decode("latin-1")
+                    break
+            try:
+                auth = _verify_authorization(authorization)
+            except HTTPException as exc:
+                # public routes ignore this; protected ones re-raise it
+                auth = exc
+            scope.setdefault("state", {})["auth"] = auth
+        await self.app(scope, receive, send)
+
+
+async def get_current_user(request: Request):
+    payload = request.state.auth
+    if isinstance(payload, HTTPException):
+        raise payload
+
+    username: str = payload["sub"]
+    user = _user_cache.get(username)
+    if user is None:
+        # only open a session on a cache miss; routes that need one still use get_db
+        with SessionLocal() as db:
+            row = db.execute(
+                select(User.id, User.username, User.role).where(User.username == username)
+            ).first()
+        if not row:
+            raise HTTPException(401, "User not found")
+        user = _user_cache[username] = AuthUser(*row)
 
     return user
 
 
+# one checker per distinct role set, so routes sharing roles share the dependency
+_ROLE_CHECKERS = {}
+
+
 def require_roles(*roles):
-    def checker(user: User = Depends(get_current_user)):
-        if user.role not in roles:
+    allowed = frozenset(roles)
+    checker = _ROLE_CHECKERS.get(allowed)
+    if checker is not None:
+        return checker
+
+    def checker(user: AuthUser = Depends(get_current_user)):
+        if user.role not in allowed:
             raise HTTPException(403, "403 Forbidden")
         return user
+    _ROLE_CHECKERS[allowed] = checker
     return checker
 
 
@@ -108,19 +222,18 @@ class ProductIn(BaseModel):
 
 class ProductOut(ProductIn):
     id: int
-    class Config:
-        from_attributes = True
 
 
 # ------------------------------------------
 # FastAPI App
 # ------------------------------------------
-app = FastAPI(title="Product Service - FastAPI ")
+app = FastAPI(title="Product Service - FastAPI ", default_response_class=ORJSONResponse)
+app.add_middleware(AuthMiddleware)
+# level 1: product lists are repetitive JSON, so the fastest level already compresses well
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=1)
 from fastapi.openapi.utils import get_openapi
 
 def custom_openapi():
-    if app.openapi_schema:
-        return app.openapi_schema
     openapi_schema = get_openapi(
         title=app.title,
         version="1.0.0",
@@ -142,8 +255,6 @@ def custom_openapi():
     app.openapi_schema = openapi_schema
     return app.openapi_schema
 
-app.openapi = custom_openapi
-
 
 # ------------------------------------------
 # Token Creation Endpoint
@@ -151,7 +262,7 @@ app.openapi = custom_openapi
 @app.post("/token", response_model=TokenResponse)
 def create_token(
     request: TokenRequest,
-    caller: User = Depends(get_current_user),
+    caller: AuthUser = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
     # Admin can generate for anyone
@@ -159,17 +270,20 @@ def create_token(
     if caller.role != "admin" and caller.username != request.username:
         raise HTTPException(403, "You can create JWT tokens only for your own account.")
 
-    user = db.query(User).filter(User.username == request.username).first()
-    if not user:
-        raise HTTPException(404, "User not found")
-
-    access_token = create_access_token(
-        data={"sub": user.username, "role": user.role},
-        expires_minutes=request.expires_minutes or ACCESS_TOKEN_EXPIRE_MINUTES,
-    )
-    expires_at = datetime.utcnow() + timedelta(
-        minutes=request.expires_minutes or ACCESS_TOKEN_EXPIRE_MINUTES
-    )
+    # the caller is already loaded by auth; only look up other users
+    if caller.username == request.username:
+        user = caller
+    else:
+        row = db.execute(
+            select(User.id, User.username, User.role).where(User.username == request.username)
+        ).first()
+        if not row:
+            raise HTTPException(404, "User not found")
+        user = AuthUser(*row)
+
+    exp = int(time.time()) + (request.expires_minutes or ACCESS_TOKEN_EXPIRE_MINUTES) * 60
+    access_token = create_access_token(data={"sub": user.username, "role": user.role, "exp": exp})
+    expires_at = datetime.fromtimestamp(exp, tz=timezone.utc)
 
     return TokenResponse(access_token=access_token, role=user.role, expires_at=expires_at)
 
@@ -177,46 +291,63 @@ def create_token(
 # ------------------------------------------
 # Product Endpoints
 # ------------------------------------------
+# read endpoints select plain columns instead of materializing ORM objects
+PRODUCT_COLUMNS = (Product.id, Product.name, Product.description, Product.price)
+
+
 @app.post("/products", response_model=ProductOut)
 def add_product(
     p: ProductIn,
-    user: User = Depends(require_roles("admin")),
+    user: AuthUser = Depends(require_roles("admin")),
     db: Session = Depends(get_db),
 ):
-    exists = db.query(Product).filter(Product.name == p.name).first()
-    if exists:
+    # the unique constraint on name does the duplicate check in the same statement
+    try:
+        pid = db.execute(
+            insert(Product).values(name=p.name, description=p.description, price=p.price)
+        ).inserted_primary_key[0]
+        db.commit()
+    except IntegrityError:
+        db.rollback()
         raise HTTPException(409, "Product name must be unique.")
 
-    product = Product(name=p.name, description=p.description, price=p.price)
-    db.add(product)
-    db.commit()
-    db.refresh(product)
-    return product
+    return ORJSONResponse({"id": pid, "name": p.name, "description": p.description, "price": p.price})
 
 
 @app.get("/products", response_model=List[ProductOut])
 def get_products(
-    user: User = Depends(require_roles("admin", "privileged")),
+    user: AuthUser = Depends(require_roles("admin", "privileged")),
     db: Session = Depends(get_db),
 ):
-    products = db.query(Product).all()
-    if not products:
+    rows = db.execute(select(*PRODUCT_COLUMNS)).all()
+    if not rows:
         raise HTTPException(status_code=200, detail="No products found")
-    return products
+    # every write goes through ProductIn validation (SQLite itself only applies
+    # type affinity), so the response_model pass over every row can be skipped
+    return ORJSONResponse([
+        {"id": i, "name": n, "description": d, "price": pr}
+        for i, n, d, pr in rows
+    ])
 
 
 @app.get("/products/{pid}", response_model=ProductOut)
 def get_product(
     pid: int,
-    user: User = Depends(require_roles("admin", "privileged")),
+    user: AuthUser = Depends(require_roles("admin", "privileged")),
     db: Session = Depends(get_db),
 ):
-    product = db.query(Product).filter(Product.id == pid).first()
-    if not product:
+    row = db.execute(select(*PRODUCT_COLUMNS).where(Product.id == pid)).first()
+    if not row:
         raise HTTPException(404, "Product not found")
-    return product
+    i, n, d, pr = row
+    return ORJSONResponse({"id": i, "name": n, "description": d, "price": pr})
 
 
 @app.get("/")
 def root():
-    return {"status": "running", "service": "Product Service"}
\ No newline at end of file
+    return {"status": "running", "service": "Product Service"}
+
+
+# build the schema once all routes are registered; /openapi.json then just returns it
+custom_openapi()
+app.openapi = lambda: app.openapi_schema
\ No newline at end of file
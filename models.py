@@ -1,6 +1,6 @@
 # models.py
 from sqlalchemy.orm import declarative_base
-from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean
+from sqlalchemy import Column, Integer, String, Float, Boolean
 
 Base = declarative_base()
 
@@ -11,8 +11,6 @@ class User(Base):
     username = Column(String, nullable=False, unique=True, index=True)
     role = Column(String, nullable=False)  # admin | privileged | nonadmin
     hashed_password = Column(String, nullable=True)  # optional (not used)
-    api_token_hash = Column(String, nullable=True)
-    token_expires_at = Column(DateTime, nullable=True)
     is_active = Column(Boolean, default=True)
 
 